@@ -7,8 +7,238 @@ do dataset de e-commerce da Olist para uso no Power BI.
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Copy-on-write: dataframes derivados compartilham memória com os originais
+# até que uma coluna seja efetivamente modificada
+pd.set_option('mode.copy_on_write', True)
+
+# Arquivos CSV do dataset da Olist
+RAW_FILES = {
+    'customers': 'olist_customers_dataset.csv',
+    'orders': 'olist_orders_dataset.csv',
+    'order_items': 'olist_order_items_dataset.csv',
+    'products': 'olist_products_dataset.csv',
+    'sellers': 'olist_sellers_dataset.csv',
+    'reviews': 'olist_order_reviews_dataset.csv'
+}
+
+# Colunas de data de cada tabela do dataset
+DATE_COLUMNS = {
+    'orders': ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_carrier_date',
+               'order_delivered_customer_date', 'order_estimated_delivery_date'],
+    'reviews': ['review_creation_date', 'review_answer_timestamp'],
+    'order_items': ['shipping_limit_date']
+}
+
+# Tabelas necessárias para as etapas que combinam mais de uma tabela
+REQUIRED_TABLES = {
+    'category_translation': {'products', 'category_translation'},
+    'fact_sales': {'orders', 'order_items'}
+}
+
+# Colunas de identificadores usadas como chaves de junção entre as tabelas
+ID_COLUMNS = ['order_id', 'customer_id', 'product_id', 'seller_id', 'review_id']
+
+# Linhas por row group do Parquet da tabela fato
+FACT_ROW_GROUP_SIZE = 128 * 1024
+
+# Formato dos timestamps do dataset. 'ISO8601' usa o parser rápido do pandas
+# e aceita tanto '%Y-%m-%d %H:%M:%S' quanto valores com frações de segundo
+OLIST_TS_FMT = 'ISO8601'
+
+# Tamanho dos blocos lidos de cada CSV pelo leitor do pyarrow
+CSV_BLOCK_SIZE = 16 << 20
+
+# Nanossegundos em um dia e representação inteira de NaT
+NS_PER_DAY = 86_400_000_000_000
+NAT_NS = np.datetime64('NaT').view('i8')
+
+# Nomes de meses e dias da semana da dimensão de data (segunda-feira = 0)
+MONTH_NAMES = pa.array(['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                        'August', 'September', 'October', 'November', 'December'])
+DAYOFWEEK_NAMES = pa.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+
+# Métricas de vendas das tabelas agregadas, no formato de agregação nomeada do pandas
+SALES_METRICS = {
+    'order_count': ('order_id', 'nunique'),
+    'total_sales': ('price', 'sum'),
+    'total_freight': ('freight_value', 'sum')
+}
+
+
+def _date_key(dates):
+    """
+    Calcula a chave inteira AAAAMMDD de uma série de datas.
+    
+    Usa aritmética inteira sobre ano, mês e dia em vez de strftime.
+    """
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('int32')
+
+
+def _timestamps_ns(series):
+    """
+    Retorna os timestamps de uma série como inteiros int64 em nanossegundos.
+    
+    Valores ausentes viram NaT, cuja representação inteira é o menor int64.
+    """
+    return series.to_numpy(dtype='datetime64[ns]', na_value=np.datetime64('NaT')).view('i8')
+
+
+def _days_between(end, start):
+    """
+    Calcula a diferença em dias (end - start) entre duas séries de timestamps.
+    
+    Opera diretamente sobre os arrays int64 em nanossegundos, sem aritmética
+    de timedelta do pandas. Regras de prazo mais elaboradas (faixas de SLA,
+    janelas de tolerância) devem ser implementadas aqui, também de forma
+    vetorizada, em vez de com apply linha a linha.
+    """
+    end_ns = _timestamps_ns(end)
+    start_ns = _timestamps_ns(start)
+    
+    days = (end_ns - start_ns) / NS_PER_DAY
+    days[(end_ns == NAT_NS) | (start_ns == NAT_NS)] = np.nan
+    
+    return pd.Series(days, index=end.index)
+
+
+def _aggregate_sales(df, by, metrics=('order_count', 'total_sales', 'total_freight')):
+    """
+    Agrupa as vendas pelas colunas `by` calculando as métricas de SALES_METRICS.
+    
+    Todas as métricas são calculadas em um único groupby com agregação
+    nomeada, já com os nomes finais das colunas. Para chaves categóricas,
+    apenas as categorias presentes nos dados geram linhas, e os grupos são
+    mantidos na ordem em que aparecem, sem ordenação final.
+    """
+    aggregations = {name: SALES_METRICS[name] for name in metrics}
+    return df.groupby(by, observed=True, sort=False, as_index=False).agg(**aggregations)
+
+
+def _rollup_sales(df, by, metrics=('order_count', 'total_sales', 'total_freight')):
+    """
+    Soma métricas já agregadas por _aggregate_sales em um nível mais alto.
+    
+    Válido apenas quando cada pedido pertence a um único grupo de origem
+    (por exemplo, cliente ou data), para que a contagem de pedidos some.
+    """
+    return df.groupby(by, observed=True, sort=False, as_index=False)[list(metrics)].sum()
+
+
+def _encode_id_columns(tables):
+    """
+    Converte as colunas de ID_COLUMNS para o tipo category em todas as tabelas.
+    
+    Cada coluna usa as mesmas categorias em todas as tabelas em que aparece,
+    de modo que as junções entre fato e dimensões comparam códigos inteiros
+    em vez de strings.
+    """
+    for col in ID_COLUMNS:
+        tables_with_col = [key for key, df in tables.items() if col in df.columns]
+        if not tables_with_col:
+            continue
+        
+        # Tabelas vazias não contribuem com categorias (e o concat do pandas
+        # deixará de ignorá-las ao definir o tipo do resultado)
+        columns = [tables[key][col] for key in tables_with_col if not tables[key].empty]
+        categories = pd.concat(columns).unique() if columns else tables[tables_with_col[0]][col].unique()
+        id_dtype = pd.CategoricalDtype(categories=categories)
+        
+        for key in tables_with_col:
+            tables[key] = tables[key].assign(**{col: tables[key][col].astype(id_dtype)})
+    
+    return tables
+
+
+def _write_parquet(df, path, row_group_size=None):
+    """
+    Grava um dataframe em Parquet com compressão zstd e dicionário.
+    
+    Por padrão a tabela inteira vai para um único row group; tabelas grandes
+    (como a fato) devem informar `row_group_size`. As estatísticas por row
+    group permitem que o Power BI e outros leitores descartem blocos ao filtrar.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(
+        table,
+        path,
+        row_group_size=row_group_size or max(len(df), 1),
+        compression='zstd',
+        compression_level=3,
+        use_dictionary=True,
+        data_page_size=1 << 20,
+        write_statistics=True
+    )
+
+
+def _parse_dates(df, date_columns):
+    """
+    Converte para datetime as colunas de data que não vieram convertidas da leitura.
+    
+    Valores vazios ou inválidos viram NaT, em vez de interromper o pipeline
+    ou deixar a coluna como texto.
+    """
+    pending = [
+        col for col in date_columns
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col])
+    ]
+    if not pending:
+        return df
+    
+    return df.assign(**{
+        col: pd.to_datetime(df[col], format=OLIST_TS_FMT, errors='coerce', cache=True)
+        for col in pending
+    })
+
+
+def _read_csv(path, date_columns=None):
+    """
+    Lê um arquivo CSV em blocos com o pyarrow e converte para pandas.
+    
+    As colunas em `date_columns` são lidas como texto e convertidas por
+    _parse_dates, para que valores inválidos virem NaT em vez de interromper
+    a leitura; as demais mantêm tipos Arrow. A tabela Arrow é liberada durante
+    a conversão para pandas, evitando manter as duas cópias em memória.
+    """
+    convert_options = pacsv.ConvertOptions(
+        column_types={col: pa.string() for col in date_columns or []},
+        strings_can_be_null=True
+    )
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        convert_options=convert_options
+    )
+    table = reader.read_all()
+    
+    # Como no leitor do pandas, colunas inteiras com valores ausentes e colunas
+    # totalmente vazias viram float, para que o preenchimento pela mediana
+    # não trunque medianas fracionárias
+    for i, field in enumerate(table.schema):
+        if pa.types.is_null(field.type) or (pa.types.is_integer(field.type) and table.column(i).null_count):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    
+    df = table.to_pandas(types_mapper=pd.ArrowDtype, self_destruct=True)
+    return _parse_dates(df, date_columns or [])
+
+
+def _id_codes(ids):
+    """
+    Retorna os códigos int32 de uma coluna de identificadores categórica.
+    
+    Como as categorias são compartilhadas entre as tabelas (ver
+    _encode_id_columns), o mesmo identificador tem o mesmo código na tabela
+    fato e nas dimensões.
+    """
+    return ids.cat.codes.astype('int32')
 
 
 def extract_data(base_path='../data/raw/'):
@@ -26,18 +256,20 @@ def extract_data(base_path='../data/raw/'):
         Dicionário contendo os dataframes carregados
     """
     try:
-        datasets = {
-            'customers': pd.read_csv(f'{base_path}olist_customers_dataset.csv'),
-            'orders': pd.read_csv(f'{base_path}olist_orders_dataset.csv'),
-            'order_items': pd.read_csv(f'{base_path}olist_order_items_dataset.csv'),
-            'products': pd.read_csv(f'{base_path}olist_products_dataset.csv'),
-            'sellers': pd.read_csv(f'{base_path}olist_sellers_dataset.csv'),
-            'reviews': pd.read_csv(f'{base_path}olist_order_reviews_dataset.csv')
-        }
+        files = dict(RAW_FILES)
         
         # Carregando tradução de categorias se existir
         if os.path.exists(f'{base_path}product_category_name_translation.csv'):
-            datasets['category_translation'] = pd.read_csv(f'{base_path}product_category_name_translation.csv')
+            files['category_translation'] = 'product_category_name_translation.csv'
+        
+        # Lendo os arquivos em paralelo; as colunas de data são convertidas logo
+        # após a leitura e as demais usam tipos Arrow
+        with ThreadPoolExecutor(max_workers=len(files)) as executor:
+            futures = {
+                key: executor.submit(_read_csv, f'{base_path}{file_name}', DATE_COLUMNS.get(key))
+                for key, file_name in files.items()
+            }
+            datasets = {key: future.result() for key, future in futures.items()}
         
         print("Datasets extraídos com sucesso!")
         return datasets
@@ -61,62 +293,49 @@ def transform_data(raw_data):
     dict
         Dicionário contendo os dataframes transformados
     """
-    transformed_data = {}
-    
-    # Copiando os dataframes para não modificar os originais
-    for key, df in raw_data.items():
-        transformed_data[key] = df.copy()
+    # Com copy-on-write não é necessário copiar os dataframes: apenas as
+    # colunas modificadas são duplicadas, sem alterar os originais
+    transformed_data = dict(raw_data)
     
-    # Convertendo colunas de data para datetime
-    date_columns = {
-        'orders': ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_carrier_date',
-                  'order_delivered_customer_date', 'order_estimated_delivery_date'],
-        'reviews': ['review_creation_date', 'review_answer_timestamp'],
-        'order_items': ['shipping_limit_date']
-    }
+    # As colunas de data já chegam convertidas de extract_data
     
-    for table, columns in date_columns.items():
-        if table in transformed_data:
-            for col in columns:
-                if col in transformed_data[table].columns:
-                    transformed_data[table][col] = pd.to_datetime(transformed_data[table][col], errors='coerce')
-    
-    # Tratando valores ausentes
+    # Tratando valores ausentes com um único fillna por tabela
     for key, df in transformed_data.items():
-        # Para colunas numéricas, preenchemos com a mediana
-        for col in df.select_dtypes(include=[np.number]).columns:
-            df[col] = df[col].fillna(df[col].median())
+        # Para colunas numéricas, preenchemos com a mediana (calculada em uma única redução);
+        # colunas sem nenhum valor não têm mediana e ficam como estão
+        fill_values = df.select_dtypes(include=[np.number]).median().dropna().to_dict()
         
         # Para colunas de texto, preenchemos com 'unknown'
-        for col in df.select_dtypes(include=['object']).columns:
-            df[col] = df[col].fillna('unknown')
+        fill_values.update({col: 'unknown' for col in df.select_dtypes(include=['object', 'string']).columns})
+        
+        transformed_data[key] = df.fillna(fill_values)
     
     # Adicionando colunas derivadas úteis
     if 'orders' in transformed_data:
-        # Extraindo componentes de data
-        transformed_data['orders']['purchase_year'] = transformed_data['orders']['order_purchase_timestamp'].dt.year
-        transformed_data['orders']['purchase_month'] = transformed_data['orders']['order_purchase_timestamp'].dt.month
-        transformed_data['orders']['purchase_day'] = transformed_data['orders']['order_purchase_timestamp'].dt.day
-        transformed_data['orders']['purchase_dayofweek'] = transformed_data['orders']['order_purchase_timestamp'].dt.dayofweek
-        transformed_data['orders']['purchase_quarter'] = transformed_data['orders']['order_purchase_timestamp'].dt.quarter
-        
-        # Calculando tempo de entrega (em dias)
-        transformed_data['orders']['delivery_time_days'] = (
-            transformed_data['orders']['order_delivered_customer_date'] - 
-            transformed_data['orders']['order_purchase_timestamp']
-        ).dt.total_seconds() / (24 * 3600)
-        
-        # Calculando atraso na entrega (em dias, negativo significa entrega antecipada)
-        transformed_data['orders']['delivery_delay_days'] = (
-            transformed_data['orders']['order_delivered_customer_date'] - 
-            transformed_data['orders']['order_estimated_delivery_date']
-        ).dt.total_seconds() / (24 * 3600)
-        
-        # Marcando se entrega foi feita dentro do prazo
-        transformed_data['orders']['delivered_on_time'] = transformed_data['orders']['delivery_delay_days'] <= 0
+        orders = transformed_data['orders']
+        purchase = orders['order_purchase_timestamp']
+        delivered = orders['order_delivered_customer_date']
+        
+        transformed_data['orders'] = orders.assign(
+            # Extraindo componentes de data
+            purchase_year=purchase.dt.year,
+            purchase_month=purchase.dt.month,
+            purchase_day=purchase.dt.day,
+            purchase_dayofweek=purchase.dt.dayofweek,
+            purchase_quarter=purchase.dt.quarter,
+            
+            # Calculando tempo de entrega (em dias)
+            delivery_time_days=_days_between(delivered, purchase),
+            
+            # Calculando atraso na entrega (em dias, negativo significa entrega antecipada)
+            delivery_delay_days=_days_between(delivered, orders['order_estimated_delivery_date']),
+            
+            # Marcando se entrega foi feita dentro do prazo
+            delivered_on_time=lambda df: df['delivery_delay_days'] <= 0
+        )
     
     # Traduzindo categorias de produtos se a tabela de tradução estiver disponível
-    if 'products' in transformed_data and 'category_translation' in transformed_data:
+    if transformed_data.keys() >= REQUIRED_TABLES['category_translation']:
         transformed_data['products'] = pd.merge(
             transformed_data['products'],
             transformed_data['category_translation'],
@@ -124,6 +343,9 @@ def transform_data(raw_data):
             how='left'
         )
     
+    # Codificando os identificadores como categorias compartilhadas entre as tabelas
+    transformed_data = _encode_id_columns(transformed_data)
+    
     return transformed_data
 
 
@@ -151,36 +373,42 @@ def create_dimensional_model(transformed_data):
         
         if pd.notna(min_date) and pd.notna(max_date):
             # Criando sequência de datas
-            date_range = pd.date_range(start=min_date, end=max_date, freq='D')
+            dates = pa.array(pd.date_range(start=min_date, end=max_date, freq='D'))
             
-            # Criando dimensão de data
-            dim_date = pd.DataFrame({
-                'date': date_range,
-                'year': date_range.year,
-                'month': date_range.month,
-                'day': date_range.day,
-                'dayofweek': date_range.dayofweek,
-                'quarter': date_range.quarter,
-                'is_weekend': date_range.dayofweek.isin([5, 6]).astype(int),
-                'month_name': date_range.strftime('%B'),
-                'dayofweek_name': date_range.strftime('%A')
-            })
+            # Calculando os componentes de data em uma única passagem com pyarrow.compute
+            year = pc.year(dates)
+            month = pc.month(dates)
+            day = pc.day(dates)
+            dayofweek = pc.day_of_week(dates)
             
-            # Adicionando chave primária
-            dim_date['id'] = dim_date['date'].dt.strftime('%Y%m%d').astype(int)
+            # Criando dimensão de data
+            dim_date = pa.table({
+                'date': dates,
+                'year': year,
+                'month': month,
+                'day': day,
+                'dayofweek': dayofweek,
+                'quarter': pc.quarter(dates),
+                'is_weekend': pc.cast(pc.greater_equal(dayofweek, 5), pa.int64()),
+                'month_name': pc.take(MONTH_NAMES, pc.subtract(month, 1)),
+                'dayofweek_name': pc.take(DAYOFWEEK_NAMES, dayofweek),
+                
+                # Adicionando chave primária (AAAAMMDD)
+                'id': pc.cast(pc.add(pc.add(pc.multiply(year, 10000), pc.multiply(month, 100)), day), pa.int32())
+            }).to_pandas()
             
             dim_tables['date'] = dim_date
     
     # Dimensão Cliente
     if 'customers' in transformed_data:
         dim_customer = transformed_data['customers'].copy()
-        dim_customer['id'] = dim_customer['customer_id']
+        dim_customer['id'] = _id_codes(dim_customer['customer_id'])
         dim_tables['customer'] = dim_customer
     
     # Dimensão Produto
     if 'products' in transformed_data:
         dim_product = transformed_data['products'].copy()
-        dim_product['id'] = dim_product['product_id']
+        dim_product['id'] = _id_codes(dim_product['product_id'])
         
         # Adicionando nome da categoria em inglês se disponível
         if 'product_category_name_english' not in dim_product.columns:
@@ -191,7 +419,7 @@ def create_dimensional_model(transformed_data):
     # Dimensão Vendedor
     if 'sellers' in transformed_data:
         dim_seller = transformed_data['sellers'].copy()
-        dim_seller['id'] = dim_seller['seller_id']
+        dim_seller['id'] = _id_codes(dim_seller['seller_id'])
         dim_tables['seller'] = dim_seller
     
     # Dimensão Pedido
@@ -200,17 +428,17 @@ def create_dimensional_model(transformed_data):
                                               'order_approved_at', 'order_delivered_carrier_date',
                                               'order_delivered_customer_date', 'order_estimated_delivery_date',
                                               'delivery_time_days', 'delivery_delay_days', 'delivered_on_time']].copy()
-        dim_order['id'] = dim_order['order_id']
+        dim_order['id'] = _id_codes(dim_order['order_id'])
         dim_tables['order'] = dim_order
     
     # Dimensão Avaliação
     if 'reviews' in transformed_data:
         dim_review = transformed_data['reviews'].copy()
-        dim_review['id'] = dim_review['review_id']
+        dim_review['id'] = _id_codes(dim_review['review_id'])
         dim_tables['review'] = dim_review
     
     # Tabela Fato - Vendas
-    if all(k in transformed_data for k in ['orders', 'order_items']):
+    if transformed_data.keys() >= REQUIRED_TABLES['fact_sales']:
         # Juntando pedidos e itens
         fact_sales = pd.merge(
             transformed_data['order_items'],
@@ -220,7 +448,7 @@ def create_dimensional_model(transformed_data):
         )
         
         # Adicionando chave para dimensão de data
-        fact_sales['date_id'] = fact_sales['order_purchase_timestamp'].dt.strftime('%Y%m%d').astype(int)
+        fact_sales['date_id'] = _date_key(fact_sales['order_purchase_timestamp'])
         
         # Selecionando colunas relevantes
         fact_sales = fact_sales[['order_id', 'order_item_id', 'product_id', 'seller_id', 
@@ -231,6 +459,11 @@ def create_dimensional_model(transformed_data):
             reviews_simple = transformed_data['reviews'][['order_id', 'review_score']].copy()
             fact_sales = pd.merge(fact_sales, reviews_simple, on='order_id', how='left')
             fact_sales['review_score'] = fact_sales['review_score'].fillna(0).astype(int)
+        
+        # Substituindo os identificadores pelos códigos int32 das dimensões
+        fact_sales = fact_sales.assign(**{
+            col: _id_codes(fact_sales[col]) for col in ['order_id', 'product_id', 'seller_id', 'customer_id']
+        })
     else:
         fact_sales = pd.DataFrame()
     
@@ -253,34 +486,23 @@ def create_aggregated_tables(fact_table, dim_tables):
     dict
         Dicionário contendo as tabelas agregadas
     """
+    # Sem vendas não há o que agregar
+    if fact_table.empty:
+        return {}
+    
     agg_tables = {}
     
     # Vendas por data
     if 'date' in dim_tables:
         # Agrupando vendas por data_id
-        sales_by_date_id = fact_table.groupby('date_id').agg({
-            'order_id': 'nunique',
-            'price': 'sum',
-            'freight_value': 'sum'
-        }).reset_index()
-        
-        sales_by_date_id.columns = ['date_id', 'order_count', 'total_sales', 'total_freight']
-        
-        # Juntando com dimensão de data para obter informações temporais
-        sales_by_date = pd.merge(
-            sales_by_date_id,
-            dim_tables['date'][['id', 'year', 'month', 'quarter']],
-            left_on='date_id',
-            right_on='id',
-            how='inner'
-        )
+        sales_by_date_id = _aggregate_sales(fact_table, 'date_id')
+        
+        # Juntando com dimensão de data (indexada pela chave) para obter informações temporais
+        dim_date_ix = dim_tables['date'].set_index('id')
+        sales_by_date = sales_by_date_id.join(dim_date_ix[['year', 'month', 'quarter']], on='date_id', how='inner')
         
         # Agregando por mês
-        sales_by_month = sales_by_date.groupby(['year', 'month', 'quarter']).agg({
-            'order_count': 'sum',
-            'total_sales': 'sum',
-            'total_freight': 'sum'
-        }).reset_index()
+        sales_by_month = _rollup_sales(sales_by_date, ['year', 'month', 'quarter'])
         
         # Calculando métricas adicionais
         sales_by_month['avg_order_value'] = sales_by_month['total_sales'] / sales_by_month['order_count']
@@ -290,56 +512,40 @@ def create_aggregated_tables(fact_table, dim_tables):
     
     # Vendas por categoria de produto
     if 'product' in dim_tables:
-        # Juntando tabela fato com dimensão de produto
-        sales_with_product = pd.merge(
-            fact_table,
-            dim_tables['product'][['id', 'product_category_name', 'product_category_name_english']],
-            left_on='product_id',
-            right_on='id',
-            how='inner'
-        )
-        
-        # Agrupando por categoria
+        # Mapeando cada produto para sua categoria, sem materializar a junção completa
         category_name_col = 'product_category_name_english' if 'product_category_name_english' in dim_tables['product'].columns else 'product_category_name'
-        sales_by_category = sales_with_product.groupby(category_name_col).agg({
-            'order_id': 'nunique',
-            'price': 'sum',
-            'freight_value': 'sum'
-        }).reset_index()
+        category_map = dim_tables['product'].set_index('id')[category_name_col]
+        sales_with_category = fact_table.assign(category_name=fact_table['product_id'].map(category_map))
         
-        sales_by_category.columns = ['category_name', 'order_count', 'total_sales', 'total_freight']
+        # Agrupando por categoria (produtos sem categoria mapeada são descartados)
+        sales_by_category = _aggregate_sales(sales_with_category, 'category_name')
         sales_by_category['avg_order_value'] = sales_by_category['total_sales'] / sales_by_category['order_count']
         
         agg_tables['sales_by_category'] = sales_by_category
     
     # Vendas por localização (estado)
     if 'customer' in dim_tables:
-        # Juntando tabela fato com dimensão de cliente
-        sales_with_customer = pd.merge(
-            fact_table,
-            dim_tables['customer'][['id', 'customer_state', 'customer_city']],
-            left_on='customer_id',
-            right_on='id',
+        # Agregando a tabela fato por cliente antes de juntar com a dimensão:
+        # cada pedido tem um único cliente, então as contagens podem ser somadas
+        sales_by_customer = _aggregate_sales(fact_table, 'customer_id')
+        
+        # Juntando as vendas por cliente com a dimensão de cliente indexada pela chave
+        dim_customer_ix = dim_tables['customer'].set_index('id')
+        sales_with_customer = sales_by_customer.join(
+            dim_customer_ix[['customer_state', 'customer_city']],
+            on='customer_id',
             how='inner'
         )
         
         # Agrupando por estado
-        sales_by_state = sales_with_customer.groupby('customer_state').agg({
-            'order_id': 'nunique',
-            'price': 'sum',
-            'freight_value': 'sum'
-        }).reset_index()
-        
-        sales_by_state.columns = ['state', 'order_count', 'total_sales', 'total_freight']
+        sales_by_state = _rollup_sales(sales_with_customer, 'customer_state')
+        sales_by_state = sales_by_state.rename(columns={'customer_state': 'state'})
         sales_by_state['avg_order_value'] = sales_by_state['total_sales'] / sales_by_state['order_count']
         
         # Agrupando por cidade (top cidades)
-        sales_by_city = sales_with_customer.groupby(['customer_state', 'customer_city']).agg({
-            'order_id': 'nunique',
-            'price': 'sum'
-        }).reset_index()
-        
-        sales_by_city.columns = ['state', 'city', 'order_count', 'total_sales']
+        sales_by_city = _rollup_sales(sales_with_customer, ['customer_state', 'customer_city'],
+                                      metrics=('order_count', 'total_sales'))
+        sales_by_city = sales_by_city.rename(columns={'customer_state': 'state', 'customer_city': 'city'})
         sales_by_city['location'] = sales_by_city['city'] + ' (' + sales_by_city['state'] + ')'
         
         agg_tables['sales_by_location'] = sales_by_state
@@ -347,23 +553,12 @@ def create_aggregated_tables(fact_table, dim_tables):
     
     # Vendas por vendedor
     if 'seller' in dim_tables:
-        # Juntando tabela fato com dimensão de vendedor
-        sales_with_seller = pd.merge(
-            fact_table,
-            dim_tables['seller'][['id', 'seller_state', 'seller_city']],
-            left_on='seller_id',
-            right_on='id',
-            how='inner'
-        )
-        
-        # Agrupando por vendedor
-        sales_by_seller = sales_with_seller.groupby('seller_id').agg({
-            'order_id': 'nunique',
-            'price': 'sum',
-            'freight_value': 'sum'
-        }).reset_index()
-        
-        sales_by_seller.columns = ['seller_id', 'order_count', 'total_sales', 'total_freight']
+        # Agrupando por vendedor e trocando o código pelo identificador original,
+        # mantendo apenas os vendedores da dimensão
+        seller_ids = dim_tables['seller'].set_index('id')['seller_id']
+        sales_by_seller = _aggregate_sales(fact_table, 'seller_id')
+        sales_by_seller['seller_id'] = sales_by_seller['seller_id'].map(seller_ids)
+        sales_by_seller = sales_by_seller.dropna(subset=['seller_id']).reset_index(drop=True)
         sales_by_seller['avg_order_value'] = sales_by_seller['total_sales'] / sales_by_seller['order_count']
         
         agg_tables['sales_by_seller'] = sales_by_seller
@@ -371,14 +566,11 @@ def create_aggregated_tables(fact_table, dim_tables):
     # Métricas de avaliação
     if 'review_score' in fact_table.columns:
         # Agrupando por pontuação de avaliação
-        review_metrics = fact_table.groupby('review_score').agg({
-            'order_id': 'nunique',
-            'price': 'sum'
-        }).reset_index()
+        review_metrics = _aggregate_sales(fact_table, 'review_score', metrics=('order_count', 'total_sales'))
         
-        review_metrics.columns = ['review_score', 'order_count', 'total_sales']
+        agg_tables['review_metrics'] = review_metrics
         
-        # Calculando NPS
+        # Calculando NPS como uma tabela de uma linha, em vez de repetir o valor em cada linha
         if not review_metrics.empty:
             total_reviews = review_metrics['order_count'].sum()
             promoters = review_metrics[review_metrics['review_score'] == 5]['order_count'].sum()
@@ -386,14 +578,17 @@ def create_aggregated_tables(fact_table, dim_tables):
             
             nps = (promoters / total_reviews * 100) - (detractors / total_reviews * 100)
             
-            review_metrics['nps'] = nps
-        
-        agg_tables['review_metrics'] = review_metrics
+            agg_tables['nps'] = pd.DataFrame({
+                'nps': [nps],
+                'promoters': [promoters],
+                'detractors': [detractors],
+                'total': [total_reviews]
+            })
     
     return agg_tables
 
 
-def export_to_power_bi(dim_tables, fact_table, agg_tables, output_path='../data/transformed/'):
+def export_to_power_bi(dim_tables, fact_table, agg_tables, output_path='../data/transformed/', keep_csv=False):
     """
     Exporta as tabelas dimensionais, fato e agregadas para uso no Power BI.
     
@@ -407,6 +602,8 @@ def export_to_power_bi(dim_tables, fact_table, agg_tables, output_path='../data/
         Dicionário contendo as tabelas agregadas
     output_path : str
         Caminho para salvar os arquivos
+    keep_csv : bool
+        Se True, também grava cada tabela em CSV além do Parquet
         
     Returns:
     --------
@@ -417,19 +614,27 @@ def export_to_power_bi(dim_tables, fact_table, agg_tables, output_path='../data/
         # Criando diretório se não existir
         os.makedirs(output_path, exist_ok=True)
         
-        # Salvando tabelas dimensionais
-        for name, df in dim_tables.items():
-            df.to_csv(f'{output_path}dim_{name}.csv', index=False)
-            df.to_parquet(f'{output_path}dim_{name}.parquet')
+        # Tabelas dimensionais, fato e agregadas com o nome do arquivo de saída
+        tables = (
+            [(f'dim_{name}', df) for name, df in dim_tables.items()]
+            + [('fact_sales', fact_table)]
+            + [(f'agg_{name}', df) for name, df in agg_tables.items()]
+        )
         
-        # Salvando tabela fato
-        fact_table.to_csv(f'{output_path}fact_sales.csv', index=False)
-        fact_table.to_parquet(f'{output_path}fact_sales.parquet')
+        def export_table(file_name, df):
+            # Dimensões e agregadas são pequenas e ficam em um único row group
+            row_group_size = FACT_ROW_GROUP_SIZE if file_name == 'fact_sales' else None
+            _write_parquet(df, f'{output_path}{file_name}.parquet', row_group_size)
+            if keep_csv:
+                df.to_csv(f'{output_path}{file_name}.csv', index=False)
         
-        # Salvando tabelas agregadas
-        for name, df in agg_tables.items():
-            df.to_csv(f'{output_path}agg_{name}.csv', index=False)
-            df.to_parquet(f'{output_path}agg_{name}.parquet')
+        # Gravando os arquivos em paralelo (o pyarrow libera o GIL durante a codificação)
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = [executor.submit(export_table, file_name, df) for file_name, df in tables]
+            
+            # Propagando eventuais erros de gravação
+            for future in futures:
+                future.result()
         
         print(f"Dados exportados com sucesso para {output_path}")
         return True
@@ -476,6 +681,8 @@ def create_power_bi_instructions(output_path='../reports/dashboard/'):
    - dim_review.parquet
 
 ### Opção 2: Importar arquivos CSV
+Os arquivos CSV só são gerados com `export_to_power_bi(..., keep_csv=True)`.
+
 1. Abra o Power BI Desktop
 2. Clique em "Obter Dados" > "Texto/CSV"
 3. Navegue até a pasta `data/transformed`
@@ -491,6 +698,8 @@ def create_power_bi_instructions(output_path='../reports/dashboard/'):
    - fact_sales[seller_id] → dim_seller[id]
    - fact_sales[date_id] → dim_date[id]
    - fact_sales[order_id] → dim_order[id]
+3. As chaves são códigos inteiros; o identificador original de cada registro
+   fica na coluna `<entidade>_id` da dimensão (ex.: dim_order[order_id])
 
 ### Criar Medidas Calculadas
 1. Clique com o botão direito na tabela fact_sales > "Nova medida"